@@ -0,0 +1,249 @@
+from flask import request, jsonify
+import jwt
+import os
+import math
+import random
+import threading
+import time
+import redis
+from collections import deque
+from functools import wraps
+from pymongo import monitoring
+from pymongo.server_type import SERVER_TYPE
+from redis import Redis
+from typing import Optional
+
+# Configuration
+SECRET_KEY = os.getenv('SECRET_KEY', 'your-secret-key-change-in-production')
+REDIS_URI = os.getenv('REDIS_URI', 'redis://redis:6379/0')
+RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+# Smoothed Mongo command latency (ms) above which write traffic starts being shed
+MONGO_LATENCY_SHED_MS = float(os.getenv('MONGO_LATENCY_SHED_MS', '250'))
+# Latency samples older than this are ignored, so shedding stops once Mongo goes quiet
+MONGO_LATENCY_WINDOW_SECONDS = float(os.getenv('MONGO_LATENCY_WINDOW_SECONDS', '5'))
+# Commands that must have completed within the window before anything is shed
+MONGO_LATENCY_MIN_SAMPLES = int(os.getenv('MONGO_LATENCY_MIN_SAMPLES', '20'))
+# Keep rate limit checks fast when Redis is slow or unreachable; they fail open after this
+ADMISSION_REDIS_TIMEOUT = float(os.getenv('ADMISSION_REDIS_TIMEOUT', '0.1'))
+
+# Redis connection for shared token buckets
+redis_client: Optional[Redis] = redis.from_url(
+    REDIS_URI,
+    decode_responses=True,
+    socket_connect_timeout=ADMISSION_REDIS_TIMEOUT,
+    socket_timeout=ADMISSION_REDIS_TIMEOUT
+)
+
+# Atomic token bucket: refills at `rate` tokens/second up to `capacity`.
+# Returns {allowed, seconds until a token is available}.
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+
+local allowed = 0
+local retry_after = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    retry_after = (1 - tokens) / rate
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000) + 1000)
+return {allowed, tostring(retry_after)}
+"""
+
+_token_bucket = redis_client.register_script(TOKEN_BUCKET_SCRIPT)
+
+# Per-route in-flight request semaphores (per worker process)
+_route_semaphores = {}
+_route_semaphores_lock = threading.Lock()
+
+
+# Servers that take writes; commands routed to secondaries do not count toward shedding
+WRITABLE_SERVER_TYPES = (SERVER_TYPE.RSPrimary, SERVER_TYPE.Standalone, SERVER_TYPE.Mongos)
+
+
+class MongoLatencyMonitor(monitoring.CommandListener, monitoring.ServerListener):
+    """Track an exponentially weighted moving average of Mongo command latency
+    on the primary, which is what the guarded write routes depend on"""
+
+    def __init__(self, alpha=0.2, min_samples=MONGO_LATENCY_MIN_SAMPLES):
+        self.alpha = alpha
+        self.average_ms = 0.0
+        # Completion times of the most recent `min_samples` commands
+        self.recent_samples = deque(maxlen=max(1, min_samples))
+        self.primary_addresses = set()
+        self._lock = threading.Lock()
+
+    def _record(self, event):
+        duration_ms = event.duration_micros / 1000.0
+        with self._lock:
+            if event.connection_id not in self.primary_addresses:
+                return
+            # Always decay toward the new sample: a single slow command after an
+            # idle period must not jump the average straight past the threshold
+            self.average_ms += self.alpha * (duration_ms - self.average_ms)
+            self.recent_samples.append(time.monotonic())
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._record(event)
+
+    def failed(self, event):
+        self._record(event)
+
+    def opened(self, event):
+        pass
+
+    def description_changed(self, event):
+        with self._lock:
+            if event.new_description.server_type in WRITABLE_SERVER_TYPES:
+                self.primary_addresses.add(event.server_address)
+            else:
+                self.primary_addresses.discard(event.server_address)
+
+    def closed(self, event):
+        with self._lock:
+            self.primary_addresses.discard(event.server_address)
+
+    def shed_probability(self):
+        """Fraction of write traffic to reject, rising linearly from 0 at the
+        threshold to 1 at twice the threshold"""
+        with self._lock:
+            # Only shed on sustained traffic: the window must hold min_samples commands
+            if (len(self.recent_samples) < self.recent_samples.maxlen or
+                    time.monotonic() - self.recent_samples[0] > MONGO_LATENCY_WINDOW_SECONDS):
+                return 0.0
+            average_ms = self.average_ms
+        if average_ms <= MONGO_LATENCY_SHED_MS:
+            return 0.0
+        return min(1.0, (average_ms - MONGO_LATENCY_SHED_MS) / MONGO_LATENCY_SHED_MS)
+
+
+# Register with MongoClient(..., event_listeners=[mongo_latency])
+mongo_latency = MongoLatencyMonitor()
+
+
+def parse_limit(value):
+    """Parse a '<requests>/<seconds>' limit into (capacity, refill rate per second)"""
+    try:
+        requests_allowed, period = value.split('/')
+        capacity = int(requests_allowed)
+        period = float(period)
+    except ValueError:
+        raise ValueError(f"Invalid rate limit {value!r}, expected '<requests>/<seconds>'")
+    if capacity <= 0 or not 0 < period < float('inf'):
+        raise ValueError(f'Invalid rate limit {value!r}, requests and seconds must be positive')
+    return capacity, capacity / period
+
+
+def get_client_ip():
+    """Resolve the caller's IP. Services wrap their app in ProxyFix(x_for=1), so
+    remote_addr is the address the nginx gateway saw, not a client-supplied header."""
+    return request.remote_addr or 'unknown'
+
+
+def get_token_user_id():
+    """Return the user id from the bearer token, or None if it is missing or invalid"""
+    token = request.headers.get('Authorization')
+    if not token:
+        return None
+    try:
+        data = jwt.decode(token.replace('Bearer ', ''), SECRET_KEY, algorithms=['HS256'])
+        return data.get('user_id')
+    except jwt.InvalidTokenError:
+        return None
+
+
+def take_token(key, limit):
+    """Take one token from the (capacity, rate) bucket at `key`.
+    Returns (allowed, retry_after_seconds)."""
+    capacity, rate = limit
+    try:
+        allowed, retry_after = _token_bucket(keys=[key], args=[capacity, rate])
+        return bool(allowed), float(retry_after)
+    except Exception as e:
+        # Fail open: an unavailable Redis must not take the API down with it
+        print(f"Failed to check rate limit for {key}: {e}")
+        return True, 0.0
+
+
+def get_route_semaphore(route, max_concurrent):
+    with _route_semaphores_lock:
+        if route not in _route_semaphores:
+            _route_semaphores[route] = threading.BoundedSemaphore(max_concurrent)
+        return _route_semaphores[route]
+
+
+def reject(message, status, retry_after):
+    response = jsonify({'message': message})
+    response.status_code = status
+    response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
+def admission_control(route, user_limit=None, ip_limit=None, max_concurrent=None,
+                      identity=get_token_user_id, shed_on_overload=True):
+    """Reject requests before they reach Mongo when the caller is over its
+    rate limit (429), the route is at its concurrency cap (503) or Mongo
+    latency is above MONGO_LATENCY_SHED_MS (503).
+
+    Limits are '<requests>/<seconds>' strings and can be overridden with
+    RATE_LIMIT_<ROUTE>_USER, RATE_LIMIT_<ROUTE>_IP and
+    MAX_CONCURRENT_<ROUTE> environment variables. Apply it above
+    token_required so rejected requests never touch the database.
+    """
+    env_prefix = route.upper()
+    user_limit = os.getenv(f'RATE_LIMIT_{env_prefix}_USER', user_limit)
+    ip_limit = os.getenv(f'RATE_LIMIT_{env_prefix}_IP', ip_limit)
+    max_concurrent = int(os.getenv(f'MAX_CONCURRENT_{env_prefix}', max_concurrent or 0))
+    # Parse once so a bad RATE_LIMIT_* value fails at startup, not per request
+    user_limit = parse_limit(user_limit) if user_limit else None
+    ip_limit = parse_limit(ip_limit) if ip_limit else None
+
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            if not RATE_LIMIT_ENABLED:
+                return f(*args, **kwargs)
+
+            if shed_on_overload and random.random() < mongo_latency.shed_probability():
+                return reject('Service is overloaded, please retry later', 503, 1)
+
+            if ip_limit:
+                allowed, retry_after = take_token(f'ratelimit:{route}:ip:{get_client_ip()}', ip_limit)
+                if not allowed:
+                    return reject('Too many requests', 429, retry_after)
+
+            user_id = identity() if user_limit else None
+            if user_id:
+                allowed, retry_after = take_token(f'ratelimit:{route}:user:{user_id}', user_limit)
+                if not allowed:
+                    return reject('Too many requests', 429, retry_after)
+
+            if not max_concurrent:
+                return f(*args, **kwargs)
+
+            semaphore = get_route_semaphore(route, max_concurrent)
+            if not semaphore.acquire(blocking=False):
+                return reject('Too many concurrent requests, please retry later', 503, 1)
+            try:
+                return f(*args, **kwargs)
+            finally:
+                semaphore.release()
+
+        return decorated
+
+    return decorator
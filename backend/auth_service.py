@@ -5,15 +5,19 @@ import datetime
 from pymongo import MongoClient
 import os
 from functools import wraps
+from werkzeug.middleware.proxy_fix import ProxyFix
+from admission_control import admission_control, mongo_latency
 
 app = Flask(__name__)
+# Trust the client address forwarded by the nginx gateway
+app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1)
 
 # Configuration
 SECRET_KEY = os.getenv('SECRET_KEY', 'your-secret-key-change-in-production')
 MONGO_URI = os.getenv('MONGO_URI', 'mongodb://mongodb:27017/commercify')
 
 # MongoDB connection
-client = MongoClient(MONGO_URI)
+client = MongoClient(MONGO_URI, event_listeners=[mongo_latency])
 db = client.commercify
 users_collection = db.users
 
@@ -39,6 +43,13 @@ def token_required(f):
     
     return decorated
 
+def get_login_email():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return None
+    email = data.get('email')
+    return email if isinstance(email, str) else None
+
 @app.route('/register', methods=['POST'])
 def register():
     try:
@@ -95,6 +106,8 @@ def register():
         return jsonify({'message': f'Registration failed: {str(e)}'}), 500
 
 @app.route('/login', methods=['POST'])
+@admission_control('login', user_limit='5/60', ip_limit='20/60', max_concurrent=16,
+                   identity=get_login_email)
 def login():
     try:
         data = request.get_json()
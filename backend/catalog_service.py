@@ -6,21 +6,36 @@ import datetime
 import redis
 import json
 from functools import wraps
+from werkzeug.middleware.proxy_fix import ProxyFix
 from bson.objectid import ObjectId
+from bson.errors import InvalidId
 from redis import Redis
 from typing import Optional
+from admission_control import admission_control, mongo_latency
+from read_preferences import read_preference_for
 
 app = Flask(__name__)
+# Trust the client address forwarded by the nginx gateway
+app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1)
 
 # Configuration
 SECRET_KEY = os.getenv('SECRET_KEY', 'your-secret-key-change-in-production')
 MONGO_URI = os.getenv('MONGO_URI', 'mongodb://mongodb:27017/commercify')
 REDIS_URI = os.getenv('REDIS_URI', 'redis://redis:6379/0')
+MAX_LOOKUP_IDS = int(os.getenv('MAX_LOOKUP_IDS', '100'))
 
 # MongoDB connection
-client = MongoClient(MONGO_URI)
+client = MongoClient(MONGO_URI, event_listeners=[mongo_latency])
 db = client.commercify
 products_collection = db.products
+# Catalog listings and lookups tolerate bounded staleness; writes and ownership checks use the primary
+products_read_collection = products_collection.with_options(
+    read_preference=read_preference_for('catalog', 'secondaryPreferred')
+)
+# Quotes exist to catch stock problems before checkout, so they read current stock
+products_quote_collection = products_collection.with_options(
+    read_preference=read_preference_for('quote', 'primary')
+)
 
 # Redis connection for pub/sub
 redis_client: Optional[Redis] = redis.from_url(REDIS_URI, decode_responses=True)
@@ -73,10 +88,42 @@ def publish_product_update(product_data, action):
     except Exception as e:
         print(f"Failed to publish product update: {e}")
 
+def find_products_by_ids(product_ids, collection=products_read_collection):
+    """Fetch many products in a single $in query, keyed by string id"""
+    object_ids = [ObjectId(product_id) for product_id in product_ids]
+    products = {}
+    for product in collection.find({'_id': {'$in': object_ids}}):
+        product['id'] = str(product['_id'])
+        del product['_id']
+        products[product['id']] = product
+    return products
+
+def lookup_response(product_ids):
+    if not isinstance(product_ids, list) or not product_ids:
+        return jsonify({'message': 'ids are required'}), 400
+    if len(product_ids) > MAX_LOOKUP_IDS:
+        return jsonify({'message': f'At most {MAX_LOOKUP_IDS} ids can be looked up at once'}), 400
+
+    # Preserve request order and drop duplicates
+    product_ids = list(dict.fromkeys(str(product_id) for product_id in product_ids))
+    try:
+        products = find_products_by_ids(product_ids)
+    except InvalidId:
+        return jsonify({'message': 'Invalid product id'}), 400
+
+    return jsonify({
+        'products': [products[product_id] for product_id in product_ids if product_id in products],
+        'missing': [product_id for product_id in product_ids if product_id not in products]
+    }), 200
+
 @app.route('/products', methods=['GET'])
 def get_products():
     try:
-        products = list(products_collection.find())
+        ids = request.args.get('ids')
+        if ids is not None:
+            return lookup_response([product_id for product_id in ids.split(',') if product_id])
+
+        products = list(products_read_collection.find())
         
         # Convert ObjectId to string for JSON serialization
         for product in products:
@@ -87,6 +134,118 @@ def get_products():
     except Exception as e:
         return jsonify({'message': f'Failed to fetch products: {str(e)}'}), 500
 
+def parse_quantity(value):
+    """Return a positive integer quantity, or None if `value` is not one"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, str):
+        try:
+            value = int(value)
+        except ValueError:
+            return None
+    if not isinstance(value, int) or value <= 0:
+        return None
+    return value
+
+@app.route('/products/lookup', methods=['POST'])
+def lookup_products():
+    try:
+        data = request.get_json()
+        if data is None:
+            return jsonify({'message': 'Invalid JSON data'}), 400
+
+        if not isinstance(data, dict):
+            return jsonify({'message': 'ids are required'}), 400
+
+        return lookup_response(data.get('ids'))
+    except Exception as e:
+        return jsonify({'message': f'Failed to look up products: {str(e)}'}), 500
+
+@app.route('/products/quote', methods=['POST'])
+def quote_products():
+    """Price a cart and check stock without reserving anything"""
+    try:
+        data = request.get_json()
+        if data is None:
+            return jsonify({'message': 'Invalid JSON data'}), 400
+
+        items = data.get('items', []) if isinstance(data, dict) else None
+
+        if not isinstance(items, list):
+            return jsonify({'message': 'Invalid item data'}), 400
+        if not items:
+            return jsonify({'message': 'Order items are required'}), 400
+        if len(items) > MAX_LOOKUP_IDS:
+            return jsonify({'message': f'At most {MAX_LOOKUP_IDS} items can be quoted at once'}), 400
+
+        requested = []
+        for item in items:
+            if not isinstance(item, dict):
+                return jsonify({'message': 'Invalid item data'}), 400
+
+            product_id = item.get('productId')
+            quantity = parse_quantity(item.get('quantity', 1))
+
+            if not product_id or quantity is None:
+                return jsonify({'message': 'Invalid item data'}), 400
+
+            requested.append((str(product_id), quantity))
+
+        # create_order deducts stock line by line, so duplicate lines draw on the same stock
+        requested_totals = {}
+        for product_id, quantity in requested:
+            requested_totals[product_id] = requested_totals.get(product_id, 0) + quantity
+
+        try:
+            products = find_products_by_ids(list(requested_totals), collection=products_quote_collection)
+        except InvalidId:
+            return jsonify({'message': 'Invalid product id'}), 400
+
+        problems = []
+        for product_id, quantity in requested_totals.items():
+            product = products.get(product_id)
+            if not product:
+                problems.append({
+                    'productId': product_id,
+                    'message': f'Product {product_id} not found'
+                })
+            elif product['stock'] < quantity:
+                problems.append({
+                    'productId': product_id,
+                    'message': f'Insufficient stock for {product["name"]}. Available: {product["stock"]}',
+                    'available': product['stock'],
+                    'requested': quantity
+                })
+
+        quote_items = []
+        total_amount = 0
+
+        for product_id, quantity in requested:
+            product = products.get(product_id)
+            if not product:
+                continue
+
+            item_total = product['price'] * quantity
+            total_amount += item_total
+
+            quote_items.append({
+                'productId': product_id,
+                'productName': product['name'],
+                'quantity': quantity,
+                'price': product['price'],
+                'stock': product['stock'],
+                'total': item_total
+            })
+
+        return jsonify({
+            'items': quote_items,
+            'total': total_amount,
+            'valid': not problems,
+            'problems': problems
+        }), 200
+    except Exception as e:
+        return jsonify({'message': f'Failed to quote products: {str(e)}'}), 500
+
 @app.route('/products', methods=['POST'])
 @token_required
 def create_product(current_user):
@@ -217,6 +376,7 @@ def delete_product(current_user, product_id):
         return jsonify({'message': f'Failed to delete product: {str(e)}'}), 500
 
 @app.route('/stock/<product_id>', methods=['POST'])
+@admission_control('stock', user_limit='30/60', ip_limit='60/60', max_concurrent=16)
 @token_required
 def update_stock(current_user, product_id):
     try:
@@ -6,22 +6,34 @@ import datetime
 import redis
 import json
 from functools import wraps
+from werkzeug.middleware.proxy_fix import ProxyFix
 from bson.objectid import ObjectId
 from redis import Redis
 from typing import Optional
+from admission_control import admission_control, mongo_latency
+from read_preferences import read_preference_for, MAX_STALENESS_SECONDS
 
 app = Flask(__name__)
+# Trust the client address forwarded by the nginx gateway
+app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1)
 
 # Configuration
 SECRET_KEY = os.getenv('SECRET_KEY', 'your-secret-key-change-in-production')
 MONGO_URI = os.getenv('MONGO_URI', 'mongodb://mongodb:27017/commercify')
 REDIS_URI = os.getenv('REDIS_URI', 'redis://redis:6379/0')
+# How long a buyer's order history is read from the primary after they place an order.
+# Must exceed the staleness bound: the driver's lag estimate can be off by a heartbeat (10s).
+READ_YOUR_WRITES_SECONDS = int(os.getenv('READ_YOUR_WRITES_SECONDS', str(MAX_STALENESS_SECONDS + 30)))
 
 # MongoDB connection
-client = MongoClient(MONGO_URI)
+client = MongoClient(MONGO_URI, event_listeners=[mongo_latency])
 db = client.commercify
 orders_collection = db.orders
 products_collection = db.products
+# Order history tolerates bounded staleness; checkout and ownership checks use the primary
+orders_history_collection = orders_collection.with_options(
+    read_preference=read_preference_for('order_history', 'secondaryPreferred')
+)
 
 # Redis connection
 redis_client: Optional[Redis] = redis.from_url(REDIS_URI, decode_responses=True)
@@ -59,7 +71,25 @@ def publish_stock_update(product_id, stock):
     except Exception as e:
         print(f"Failed to publish stock update: {e}")
 
+def mark_recent_order(user_id):
+    """Pin the user's order history reads to the primary until secondaries catch up"""
+    try:
+        assert redis_client is not None
+        redis_client.setex(f'orders:recent_write:{user_id}', READ_YOUR_WRITES_SECONDS, 1)
+    except Exception as e:
+        print(f"Failed to record recent order: {e}")
+
+def has_recent_order(user_id):
+    try:
+        assert redis_client is not None
+        return bool(redis_client.exists(f'orders:recent_write:{user_id}'))
+    except Exception as e:
+        # Without the marker we cannot rule out a fresh write, so stay on the primary
+        print(f"Failed to check recent order: {e}")
+        return True
+
 @app.route('/orders', methods=['POST'])
+@admission_control('orders', user_limit='10/60', ip_limit='30/60', max_concurrent=8)
 @token_required
 def create_order(current_user):
     try:
@@ -136,6 +166,7 @@ def create_order(current_user):
         
         result = orders_collection.insert_one(order_data)
         order_id = str(result.inserted_id)
+        mark_recent_order(current_user['user_id'])
         
         # Prepare response
         order_data['id'] = order_id
@@ -156,7 +187,8 @@ def get_user_orders(current_user, user_id):
         if current_user['user_id'] != user_id:
             return jsonify({'message': 'Unauthorized'}), 403
         
-        orders = list(orders_collection.find({'userId': user_id}).sort('created_at', -1))
+        collection = orders_collection if has_recent_order(user_id) else orders_history_collection
+        orders = list(collection.find({'userId': user_id}).sort('created_at', -1))
         
         # Convert ObjectId to string for JSON serialization
         for order in orders:
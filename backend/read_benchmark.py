@@ -0,0 +1,51 @@
+import argparse
+import threading
+import time
+import requests
+
+# Measure catalog read throughput through the gateway, e.g. before and after
+# starting the "replicas" compose profile:
+#   python read_benchmark.py --url http://localhost:8080/catalog/products
+# Run the catalog service under gunicorn (docker-compose.benchmark.yml) first;
+# the Werkzeug dev server saturates long before Mongo does.
+
+
+def worker(url, deadline, counts, index):
+    session = requests.Session()
+    while time.monotonic() < deadline:
+        try:
+            response = session.get(url, timeout=10)
+            if response.status_code == 200:
+                counts[index]['ok'] += 1
+            else:
+                counts[index]['failed'] += 1
+        except requests.RequestException:
+            counts[index]['failed'] += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Catalog read throughput benchmark')
+    parser.add_argument('--url', default='http://localhost:8080/catalog/products')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=30)
+    args = parser.parse_args()
+
+    counts = [{'ok': 0, 'failed': 0} for _ in range(args.concurrency)]
+    deadline = time.monotonic() + args.duration
+    threads = [
+        threading.Thread(target=worker, args=(args.url, deadline, counts, index))
+        for index in range(args.concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    ok = sum(count['ok'] for count in counts)
+    failed = sum(count['failed'] for count in counts)
+    print(f"{ok} successful reads, {failed} failed in {args.duration:.0f}s "
+          f"({ok / args.duration:.1f} reads/s)")
+
+
+if __name__ == '__main__':
+    main()
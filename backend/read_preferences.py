@@ -0,0 +1,36 @@
+import os
+from pymongo.read_preferences import (
+    Nearest,
+    Primary,
+    PrimaryPreferred,
+    Secondary,
+    SecondaryPreferred,
+)
+
+# Configuration
+# MongoDB requires maxStalenessSeconds to be at least 90
+MAX_STALENESS_SECONDS = int(os.getenv('MAX_STALENESS_SECONDS', '90'))
+if MAX_STALENESS_SECONDS < 90:
+    raise ValueError(f'MAX_STALENESS_SECONDS must be at least 90, got {MAX_STALENESS_SECONDS}')
+
+READ_PREFERENCE_MODES = {
+    'primary': Primary,
+    'primaryPreferred': PrimaryPreferred,
+    'secondary': Secondary,
+    'secondaryPreferred': SecondaryPreferred,
+    'nearest': Nearest,
+}
+
+
+def read_preference_for(endpoint, default='primary'):
+    """Build the read preference for an endpoint from READ_PREFERENCE_<ENDPOINT>.
+
+    Non-primary modes are bounded by MAX_STALENESS_SECONDS so lagging
+    secondaries are skipped.
+    """
+    mode = os.getenv(f'READ_PREFERENCE_{endpoint.upper()}', default)
+    if mode not in READ_PREFERENCE_MODES:
+        raise ValueError(f'Unknown read preference {mode} for {endpoint}')
+    if mode == 'primary':
+        return Primary()
+    return READ_PREFERENCE_MODES[mode](max_staleness=MAX_STALENESS_SECONDS)
@@ -0,0 +1,41 @@
+// Add the secondaries from the "replicas" compose profile to replica set rs0
+const secondaries = ["mongodb-secondary-1:27017", "mongodb-secondary-2:27017"];
+
+try {
+  rs.status();
+} catch (e) {
+  rs.initiate({
+    _id: "rs0",
+    members: [
+      { _id: 0, host: "mongodb:27017" }
+    ]
+  });
+}
+
+// Wait for the primary before reconfiguring
+while (!db.hello().isWritablePrimary) {
+  sleep(1000);
+}
+
+// Secondaries are non-voting (votes: 0, priority: 0) so "mongodb" keeps a
+// majority on its own and stays primary when the profile is stopped
+const config = rs.conf();
+let changed = false;
+config.members.forEach(member => {
+  if (secondaries.includes(member.host) && (member.votes !== 0 || member.priority !== 0)) {
+    member.votes = 0;
+    member.priority = 0;
+    changed = true;
+  }
+});
+if (changed) {
+  config.version += 1;
+  rs.reconfig(config);
+}
+
+const members = config.members.map(member => member.host);
+secondaries
+  .filter(host => !members.includes(host))
+  .forEach(host => rs.add({ host: host, priority: 0, votes: 0 }));
+
+print("Replica set members: " + rs.conf().members.map(member => member.host).join(", "));
@@ -35,6 +35,12 @@ export const authAPI = {
 export const catalogAPI = {
   getProducts: () => api.get('/catalog/products'),
   
+  lookupProducts: (ids: string[]) =>
+    api.post('/catalog/products/lookup', { ids }),
+  
+  quoteCart: (items: Array<{ productId: string; quantity: number }>) =>
+    api.post('/catalog/products/quote', { items }),
+  
   createProduct: (product: Omit<Product, 'id' | 'createdAt' | 'sellerId'>) =>
     api.post('/catalog/products', product),
   